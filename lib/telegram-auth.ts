@@ -1,5 +1,46 @@
 import crypto from 'crypto'
 
+// secret_key depends only on the bot token, so derive it once per token
+let cachedSecretKey: { botToken: string; key: Buffer } | null = null
+let warnedMissingToken = false
+
+/**
+ * Returns the HMAC secret key for the given bot token
+ * According to Telegram docs: secret_key = HMAC-SHA256("WebAppData", bot_token)
+ */
+function getSecretKey(botToken: string): Buffer {
+  if (!cachedSecretKey || cachedSecretKey.botToken !== botToken) {
+    cachedSecretKey = {
+      botToken,
+      key: crypto.createHmac('sha256', 'WebAppData').update(botToken).digest(),
+    }
+  }
+  return cachedSecretKey.key
+}
+
+/**
+ * Splits initData into URL-decoded key/value pairs in a single pass
+ * Throws URIError on malformed percent-encoding
+ */
+function splitInitData(initData: string): Array<[string, string]> {
+  const decode = (part: string) => decodeURIComponent(part.replace(/\+/g, ' '))
+  const pairs: Array<[string, string]> = []
+
+  initData.split('&').forEach((pair) => {
+    if (!pair) {
+      return
+    }
+    const eq = pair.indexOf('=')
+    if (eq === -1) {
+      pairs.push([decode(pair), ''])
+    } else {
+      pairs.push([decode(pair.slice(0, eq)), decode(pair.slice(eq + 1))])
+    }
+  })
+
+  return pairs
+}
+
 /**
  * Validates Telegram Web App initData
  * @param initData - The initData string from Telegram Web App
@@ -17,38 +58,38 @@ export function validateTelegramWebAppData(initData: string): boolean {
                    process.env.TELEGRAM_BOT_TOKEN
   
   if (!botToken) {
-    console.warn('TELEGRAM_BOT_TOKEN or TELEGRAM_BOT_SECRET not set, skipping validation')
+    if (!warnedMissingToken) {
+      console.warn('TELEGRAM_BOT_TOKEN or TELEGRAM_BOT_SECRET not set, skipping validation')
+      warnedMissingToken = true
+    }
     return true // In development, you might want to skip validation
   }
 
   try {
-    // Parse initData
-    const urlParams = new URLSearchParams(initData)
-    const hash = urlParams.get('hash')
-    
+    // Parse initData and separate the hash in one pass
+    let hash: string | null = null
+    const fields: Array<[string, string]> = []
+    for (const field of splitInitData(initData)) {
+      if (field[0] === 'hash') {
+        hash = field[1]
+      } else {
+        fields.push(field)
+      }
+    }
+
     if (!hash) {
       return false
     }
 
-    // Remove hash from params for validation
-    urlParams.delete('hash')
-
-    // Sort parameters alphabetically
-    const dataCheckString = Array.from(urlParams.entries())
-      .sort(([a], [b]) => a.localeCompare(b))
+    // Sort parameters alphabetically by key (plain code unit order, as Telegram does)
+    const dataCheckString = fields
+      .sort(([a], [b]) => (a < b ? -1 : a > b ? 1 : 0))
       .map(([key, value]) => `${key}=${value}`)
       .join('\n')
 
-    // Create secret key using bot token
-    // According to Telegram docs: secret_key = HMAC-SHA256("WebAppData", bot_token)
-    const secretKey = crypto
-      .createHmac('sha256', 'WebAppData')
-      .update(botToken)
-      .digest()
-
     // Calculate hash
     const calculatedHash = crypto
-      .createHmac('sha256', secretKey)
+      .createHmac('sha256', getSecretKey(botToken))
       .update(dataCheckString)
       .digest('hex')
 
@@ -64,18 +105,17 @@ export function validateTelegramWebAppData(initData: string): boolean {
  * Parses initData and returns user information
  */
 export function parseInitData(initData: string) {
-  const urlParams = new URLSearchParams(initData)
-  const userParam = urlParams.get('user')
-  
-  if (!userParam) {
-    return null
-  }
-
   try {
-    return JSON.parse(decodeURIComponent(userParam))
+    const userField = splitInitData(initData).find(([key]) => key === 'user')
+
+    if (!userField || !userField[1]) {
+      return null
+    }
+
+    // Values are already URL-decoded by splitInitData
+    return JSON.parse(userField[1])
   } catch (error) {
     console.error('Error parsing user data:', error)
     return null
   }
 }
-